@@ -1,59 +1,267 @@
 import os
+import re
 import shutil
-import time 
-import tempfile 
-from git import Repo, GitCommandError 
-from langchain_community.document_loaders import TextLoader
-from langchain_community.vectorstores import FAISS
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.documents import Document
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter 
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Above this many chunks, a plain NumPy matmul loses to a real ANN index
+SMALL_CORPUS_MAX = 500
+
+
+class NumpyRetriever:
+    """In-process dot-product retriever for small corpora.
+
+    For a few hundred normalized vectors, a single NumPy matmul plus
+    argpartition is faster than round-tripping through FAISS's Python/C++
+    boundary, and avoids copying vectors into FAISS-owned memory. Vectors are
+    held in float16: half the memory traffic at negligible recall loss for
+    normalized MiniLM embeddings.
+    """
+
+    def __init__(self, docs, vectors, embeddings_model, k: int = 4):
+        self.docs = list(docs)
+        self.M = np.asarray(vectors, dtype=np.float16)
+        self.embeddings_model = embeddings_model
+        self.k = k
+
+    def invoke(self, query: str):
+        q = np.asarray(self.embeddings_model.embed_query(query), dtype=np.float32)
+        return self.search_by_vector(q)
+
+    def search_by_vector(self, vector, k: int = None):
+        k = k or self.k
+        if len(self.docs) <= k:
+            return list(self.docs)
+        scores = self.M @ np.asarray(vector, dtype=self.M.dtype)
+        top = np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.docs[i] for i in top]
+
+
+class FaissHNSWRetriever:
+    """HNSW-flat retriever for larger corpora.
+
+    Builds the faiss index directly rather than through LangChain's FAISS
+    wrapper, skipping the docstore dict mapping on the insert and search
+    paths. Inner product over normalized vectors is equivalent to cosine, and
+    vectors are scalar-quantized to fp16 to halve memory bandwidth on search.
+    """
+
+    def __init__(self, docs, vectors, embeddings_model, k: int = 4):
+        import faiss
+
+        self.docs = list(docs)
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.index = faiss.IndexHNSWSQ(
+            matrix.shape[1], faiss.ScalarQuantizer.QT_fp16, 32, faiss.METRIC_INNER_PRODUCT
+        )
+        self.index.train(matrix)
+        self.index.add(matrix)
+        self.embeddings_model = embeddings_model
+        self.k = k
+
+    def invoke(self, query: str):
+        q = np.asarray(self.embeddings_model.embed_query(query), dtype=np.float32)
+        return self.search_by_vector(q)
+
+    def search_by_vector(self, vector, k: int = None):
+        k = k or self.k
+        _, ids = self.index.search(np.asarray([vector], dtype=np.float32), k)
+        return [self.docs[i] for i in ids[0] if i >= 0]
+
+
+class OnnxMiniLMEmbeddings:
+    """MiniLM encoder exported to ONNX and dynamically quantized to int8.
+
+    Runs 2-4x faster than the FP32 PyTorch path on CPUs with VNNI while
+    exposing the same embed_documents/embed_query interface LangChain expects.
+    The exported/quantized model is cached on disk so the one-time conversion
+    only happens on the first run.
+    """
+
+    BATCH_SIZE = 64
+
+    def __init__(self):
+        from transformers import AutoTokenizer
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        export_dir = os.path.join(tempfile.gettempdir(), "minilm_onnx_int8")
+        if not os.path.exists(os.path.join(export_dir, "model_quantized.onnx")):
+            print("DEBUG: Exporting and quantizing MiniLM to int8 ONNX (one-time)...")
+            model = ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True)
+            quantizer = ORTQuantizer.from_pretrained(model)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=export_dir, quantization_config=qconfig)
+
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            export_dir, file_name="model_quantized.onnx", provider="CPUExecutionProvider"
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+
+    def _encode(self, texts: list) -> list:
+        vectors = []
+        for i in range(0, len(texts), self.BATCH_SIZE):
+            batch = self.tokenizer(
+                texts[i:i + self.BATCH_SIZE],
+                padding=True, truncation=True, max_length=256, return_tensors="np",
+            )
+            hidden = self.model(**batch).last_hidden_state
+            # Mean pooling over non-padding tokens, then L2 normalize
+            mask = batch["attention_mask"][:, :, None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.linalg.norm(pooled, axis=1, keepdims=True)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts: list) -> list:
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> list:
+        return self._encode([text])[0]
+
+
+_EMBEDDINGS = None
+_EMBEDDINGS_LOCK = threading.Lock()
+
+
+def get_embeddings():
+    """Returns the shared MiniLM embeddings model, loaded once per process.
+
+    Prefers the int8 ONNX Runtime build; falls back to the FP32
+    HuggingFaceEmbeddings path if optimum/onnxruntime are not installed.
+    Loading the model re-reads ~90MB of weights and re-builds the tokenizer,
+    so we keep a single instance alive across Streamlit reruns.
+
+    Double-checked locking rather than lru_cache: the background warm-up and
+    the retriever build call this concurrently, and the first call may run
+    the one-time ONNX export, which must not execute twice into the same
+    directory.
+    """
+    global _EMBEDDINGS
+    if _EMBEDDINGS is None:
+        with _EMBEDDINGS_LOCK:
+            if _EMBEDDINGS is None:
+                _EMBEDDINGS = _load_embeddings()
+    return _EMBEDDINGS
+
+
+def _load_embeddings():
+    try:
+        return OnnxMiniLMEmbeddings()
+    except ImportError as e:
+        print(f"DEBUG: optimum/onnxruntime not available ({e}), using FP32 encoder.")
+    return HuggingFaceEmbeddings(
+        model_name=MODEL_NAME,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": 64},
+    )
 
 
 class RepoAnalyzerAgent:
+    # The only files we ever read; also drives the sparse checkout in _clone_repo
+    KEY_FILES = ["README.md", "main.py", "requirements.txt"]
+
+    # Chunking parameters (fixed windows with overlap, see _load_and_split_files)
+    CHUNK_SIZE = 1000
+    CHUNK_OVERLAP = 200
+
     # We no longer accept working_dir in __init__ as it is determined by tempfile
     def __init__(self, repo_url: str):
         self.repo_url = repo_url
         self.working_dir = "" # Temporary working directory path
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, 
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        self.head_sha = ""    # Tip commit of the clone, set by _clone_repo
 
     def _clone_repo(self):
         """Clones the repository into a temporary working directory."""
-        # Create a unique temporary directory (usually on the C: drive in a non-restricted area)
-        self.working_dir = tempfile.mkdtemp(prefix="repo_clone_")
+        # Create a unique temporary directory. Prefer tmpfs (/dev/shm) on Linux
+        # so the clone+checkout never touches block storage; fall back to the
+        # platform default temp dir elsewhere.
+        tmp_root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        self.working_dir = tempfile.mkdtemp(prefix="repo_clone_", dir=tmp_root)
         
         print(f"DEBUG: Cloning to temporary directory: {self.working_dir}")
         print(f"DEBUG: Attempting to clone public repository: {self.repo_url}")
         
+        def _git(*args):
+            return subprocess.run(
+                ["git", *args], check=True, capture_output=True, text=True
+            )
+
         try:
-            # The Git clone operation
-            Repo.clone_from(self.repo_url, self.working_dir)
+            # Shallow, blobless, sparse clone: only the tip commit is fetched and
+            # only the few files we actually read are checked out. This cuts the
+            # bytes transferred by 10-100x on large repositories. Plain
+            # subprocess calls: a single clone doesn't justify importing
+            # GitPython's reflection-heavy object model.
+            _git(
+                "clone",
+                "--depth=1",
+                "--filter=blob:none",
+                "--sparse",
+                "--no-tags",
+                "--single-branch",
+                self.repo_url,
+                self.working_dir,
+            )
+            _git("-C", self.working_dir, "sparse-checkout", "set", "--no-cone", *self.KEY_FILES)
+            self.head_sha = _git("-C", self.working_dir, "rev-parse", "HEAD").stdout.strip()
             print("DEBUG: Cloning successful.")
-        except GitCommandError as e:
-            raise RuntimeError(f"Git Clone Failed. Check URL or Git PATH: {e}") from e
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            stderr = getattr(e, "stderr", "") or str(e)
+            raise RuntimeError(f"Git Clone Failed. Check URL or Git PATH: {stderr}") from e
         except Exception as e:
             raise RuntimeError(f"Cloning failed due to unknown error: {e}") from e
 
 
+    def _load_one(self, file):
+        """Reads a single key file and splits it into overlapping windows."""
+        full_path = os.path.join(self.working_dir, file)
+        if not os.path.exists(full_path):
+            return []
+
+        print(f"DEBUG: Loading and splitting {file}...")
+        try:
+            with open(full_path, "rb") as f:
+                data = f.read().decode("utf-8", "ignore")
+        except Exception as e:
+            print(f"Could not load {file}: {e}")
+            return []
+
+        # Fixed-stride windows with overlap: a single pass over the text
+        # instead of the recursive splitter's per-character separator search.
+        stride = self.CHUNK_SIZE - self.CHUNK_OVERLAP
+        return [
+            Document(page_content=data[i:i + self.CHUNK_SIZE], metadata={"source": file})
+            for i in range(0, len(data), stride)
+        ]
+
     def _load_and_split_files(self):
         """Loads and splits content from README and other key files using the temporary path."""
-        docs = []
-        file_paths = ["README.md", "main.py", "requirements.txt"]
-        
-        for file in file_paths:
-            full_path = os.path.join(self.working_dir, file)
-            if os.path.exists(full_path):
-                print(f"DEBUG: Loading and splitting {file}...")
-                try:
-                    loader = TextLoader(full_path, encoding='utf-8')
-                    docs.extend(loader.load())
-                except Exception as e:
-                    print(f"Could not load {file}: {e}")
-        
-        chunks = self.text_splitter.split_documents(docs)
+        # File reads release the GIL, so a small thread pool overlaps the
+        # cold-cache page faults left behind by the git checkout.
+        with ThreadPoolExecutor(max_workers=len(self.KEY_FILES)) as executor:
+            per_file = list(executor.map(self._load_one, self.KEY_FILES))
+
+        chunks = []
+        seen = set()
+        for doc in (d for docs in per_file for d in docs):
+            # Collapse whitespace before hashing so boilerplate that only
+            # differs in formatting dedups; every dropped chunk saves a
+            # full transformer forward pass in the encoder.
+            key = hash(re.sub(r"\s+", " ", doc.page_content).strip())
+            if key in seen:
+                continue
+            seen.add(key)
+            chunks.append(doc)
+
         print(f"DEBUG: Total content split into {len(chunks)} chunks.")
         return chunks
 
@@ -63,7 +271,6 @@ class RepoAnalyzerAgent:
         try:
             self._clone_repo()
             temp_dir = self.working_dir # Store the temp path for cleanup
-            time.sleep(1) 
             chunks = self._load_and_split_files()
             
             # --- Cleanup the temporary directory ---
@@ -81,15 +288,30 @@ class RepoAnalyzerAgent:
             raise e 
 
 
-    def create_retriever(self, chunks):
-        """Creates and returns a FAISS-based retriever from the document chunks."""
+    def create_retriever(self, chunks, embeddings_model=None):
+        """Creates and returns a dense retriever from the document chunks."""
         # This part of the code initializes the embedding model and vector store.
         try:
-            model_name = "sentence-transformers/all-MiniLM-L6-v2"
-            embeddings_model = HuggingFaceEmbeddings(model_name=model_name)
-            
-            vectorstore = FAISS.from_documents(chunks, embeddings_model)
-            retriever = vectorstore.as_retriever()
+            if embeddings_model is None:
+                embeddings_model = get_embeddings()
+
+            # Smart batching: sorting by length packs similarly sized chunks
+            # into the same encoder batch, minimizing wasted pad tokens. One
+            # embed_documents call then embeds everything in a single dispatch.
+            chunks = sorted(chunks, key=lambda c: len(c.page_content))
+            texts = [c.page_content for c in chunks]
+            vectors = embeddings_model.embed_documents(texts)
+
+            # Both retrievers search by inner product, which only equals
+            # cosine on unit vectors; normalize once here so the guarantee
+            # holds for any embeddings backend, not just our defaults.
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+            if len(chunks) <= SMALL_CORPUS_MAX:
+                retriever = NumpyRetriever(chunks, vectors, embeddings_model)
+            else:
+                retriever = FaissHNSWRetriever(chunks, vectors, embeddings_model)
             print("DEBUG: Retriever created successfully.")
             return retriever
         except Exception as e:
@@ -2,15 +2,21 @@ import streamlit as st
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from typing import TypedDict
 from langgraph.graph import StateGraph, START, END
 
 # Import Agents
-from agents.repo_analyzer import RepoAnalyzerAgent
+from agents.repo_analyzer import RepoAnalyzerAgent, get_embeddings
 from agents.metadata_recommender import MetadataRecommenderAgent
 from agents.content_improver import ContentImproverAgent
 
+# Background worker used to warm the embeddings model while the clone runs
+# on the script thread. The parallel graph nodes already execute on langgraph
+# worker threads, so nothing else needs to be offloaded here.
+_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
 
 # --- AGENT AND GRAPH LOGIC ---
 
@@ -18,6 +24,7 @@ from agents.content_improver import ContentImproverAgent
 class AgentState(TypedDict):
     """Represents the shared state passed between agents."""
     repo_url: str
+    head_sha: str
     original_content: str
     chunks: list
     retriever: object
@@ -25,38 +32,70 @@ class AgentState(TypedDict):
     improved_content: dict
 
 # Define the agent nodes (functions)
-def analyze_repo_node(state: AgentState):
-    st.info("Agent 1: Analyzing repository structure and creating RAG index...")
+def clone_and_split_node(state: AgentState):
     repo_url = state['repo_url']
     agent = RepoAnalyzerAgent(repo_url)
-    
-    try:
-        chunks = agent.process_repo()
-    except Exception as e:
-        st.error(f"Cloning/Analysis Error: Ensure Git is installed and the repository is public. Error: {e}")
-        raise ValueError("RepoAnalyzer failed.") 
-        
-    if not chunks:
-        st.error("RepoAnalyzer failed to process any content. Stopping workflow.")
-        raise ValueError("RepoAnalyzer failed.")
 
-    retriever = agent.create_retriever(chunks)
-    full_content = "\n\n".join([c.page_content for c in chunks])
-    st.success("Analysis Complete. RAG index created.")
-    
+    with st.status("Agent 1: Analyzing repository...", expanded=True) as status:
+        st.write("Cloning and splitting repository content...")
+        # Warm the embeddings model while the clone is in flight so the
+        # retriever build that follows doesn't pay the model load.
+        _EXECUTOR.submit(get_embeddings)
+
+        try:
+            chunks = agent.process_repo()
+        except Exception as e:
+            status.update(label="Cloning failed.", state="error")
+            st.error(f"Cloning/Analysis Error: Ensure Git is installed and the repository is public. Error: {e}")
+            raise ValueError("RepoAnalyzer failed.")
+
+        if not chunks:
+            status.update(label="No content found.", state="error")
+            st.error("RepoAnalyzer failed to process any content. Stopping workflow.")
+            raise ValueError("RepoAnalyzer failed.")
+
+        st.write(f"Split content into {len(chunks)} chunks.")
+        status.update(label="Analysis Complete.", state="complete")
+
+    # The next superstep fans out; its nodes run on langgraph worker threads
+    # where st.* calls are dropped, so announce it from here.
+    st.info("Agents 1 & 2: Building RAG index and extracting metadata in parallel...")
+
+    full_content = "\n\n".join(c.page_content for c in chunks)
+
     return {
         "original_content": full_content,
         "chunks": chunks,
+        "head_sha": agent.head_sha,
+    }
+
+@st.cache_resource(show_spinner=False)
+def _build_retriever(repo_url: str, head_sha: str, _chunks: list):
+    """Builds the retriever, cached per (repo_url, commit SHA).
+
+    Re-analyzing a repo that hasn't moved reuses the existing index; the
+    chunks argument is underscore-prefixed so Streamlit doesn't hash it.
+    """
+    return RepoAnalyzerAgent(repo_url).create_retriever(_chunks)
+
+def build_retriever_node(state: AgentState):
+    # Runs in the same superstep as recommend_metadata, on a langgraph worker
+    # thread without a ScriptRunContext: st.* calls here would be silently
+    # discarded, so no UI reporting (and no extra executor hop — we are
+    # already off the script thread). Errors propagate to app.invoke and are
+    # reported by the caller.
+    retriever = _build_retriever(state['repo_url'], state['head_sha'], state['chunks'])
+
+    return {
         "retriever": retriever,
     }
 
 def recommend_metadata_node(state: AgentState):
-    st.info("Agent 2: Extracting keywords and suggesting metadata...")
+    # Same superstep as build_retriever: worker thread, no st.* calls here.
     original_content = state['original_content']
     agent = MetadataRecommenderAgent()
     metadata = agent.suggest_metadata(original_content)
-    st.success("Metadata extraction complete.")
-    
+
     return {
         "metadata": metadata
     }
@@ -67,10 +106,15 @@ def improve_content_node(state: AgentState):
     metadata = state['metadata']
     retriever = state['retriever']
     
-    with st.spinner('Waiting for OpenRouter LLM response... (This may take a moment)'):
-        agent = ContentImproverAgent(retriever)
-        improved_content = agent.generate_improved_content(original_content, metadata)
-    
+    # Render partial results as they stream in instead of freezing the UI
+    # for the whole round-trip.
+    placeholder = st.empty()
+    agent = ContentImproverAgent(retriever)
+    improved_content = agent.generate_improved_content(
+        original_content, metadata, on_partial=placeholder.json
+    )
+    placeholder.empty()
+
     st.success("Content generation complete.")
     
     return {
@@ -78,16 +122,23 @@ def improve_content_node(state: AgentState):
     }
 
 def create_graph():
-    """Defines and compiles the sequential LangGraph workflow."""
+    """Defines and compiles the LangGraph workflow.
+
+    The retriever build (CPU-bound embedding) and metadata extraction run as
+    concurrent branches after the clone/split step, then join at the content
+    improver which needs both.
+    """
     workflow = StateGraph(AgentState)
 
-    workflow.add_node("analyze_repo", analyze_repo_node)
+    workflow.add_node("clone_and_split", clone_and_split_node)
+    workflow.add_node("build_retriever", build_retriever_node)
     workflow.add_node("recommend_metadata", recommend_metadata_node)
     workflow.add_node("improve_content", improve_content_node)
 
-    workflow.add_edge(START, "analyze_repo")
-    workflow.add_edge("analyze_repo", "recommend_metadata")
-    workflow.add_edge("recommend_metadata", "improve_content")
+    workflow.add_edge(START, "clone_and_split")
+    workflow.add_edge("clone_and_split", "build_retriever")
+    workflow.add_edge("clone_and_split", "recommend_metadata")
+    workflow.add_edge(["build_retriever", "recommend_metadata"], "improve_content")
     workflow.add_edge("improve_content", END)
 
     return workflow.compile()